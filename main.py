@@ -1,12 +1,23 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from pydantic import BaseModel
 from typing import Dict, List, Optional
+from difflib import SequenceMatcher
+from itertools import chain
+import anyio.to_thread
+import asyncio
 import os
-import re
+import pickle
 import json
+import time
+import threading
 import google.generativeai as genai
-from serpapi import GoogleSearch
+import httpx
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
+from semantic_cache import SemanticCache
 
 
 load_dotenv()
@@ -20,6 +31,10 @@ class KeywordResponse(BaseModel):
     keyword: str
     original_idea: str
 
+class FetchTrendsRequest(BaseModel):
+    keyword: str
+    category_id: str = "71"  # Default to Food & Drink
+
 class TrendsResponse(BaseModel):
     keyword: str
     category_trends: Dict[str, List[str]]
@@ -51,8 +66,156 @@ class FullPipelineResponse(BaseModel):
 # --- CONFIGURATION ---
 UTILITY_MODEL = "gemini-2.5-flash-lite"
 CREATIVE_MODEL = "gemini-2.5-flash-lite"
+TREND_CACHE_PATH = os.getenv("TREND_CACHE_PATH", "trend_cache.pkl")
+TREND_CACHE_TTL = 3600  # trends are time-sensitive; don't serve hour-old data
+REDIS_URL = os.getenv("REDIS_URL")  # optional; shares the trend cache across workers
+
+# Token count drives Gemini latency and cost linearly, so prompts that embed
+# trend lists are capped at this budget
+PROMPT_TOKEN_BUDGET = 1500
+MAX_TREND_LENGTH = 60  # longer "trends" are almost always junk rows
+
+# Lexical near-duplicates ("iced coffee", "iced coffee recipe") add tokens
+# without adding signal; prune anything this similar to a kept trend
+TREND_SIMILARITY_THRESHOLD = 0.75
+MAX_PROMPT_TRENDS = 10
+
+def _approx_tokens(text: str) -> int:
+    """Rough token count (~4 chars/token); avoids a count_tokens API call"""
+    return len(text) // 4 + 1
+
+# Response schemas for Gemini JSON mode; guarantee parseable output with the
+# expected keys, so no markdown-fence stripping or key validation is needed
+_VIRAL_ANGLE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "selected_trends": {"type": "array", "items": {"type": "string"}},
+        "viral_angle": {"type": "string"},
+    },
+    "required": ["selected_trends", "viral_angle"],
+}
+
+_ANGLE_AND_SCRIPT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "selected_trends": {"type": "array", "items": {"type": "string"}},
+        "viral_angle": {"type": "string"},
+        "script": {"type": "string"},
+    },
+    "required": ["selected_trends", "viral_angle", "script"],
+}
+
+# Prompt templates, built once at import. Interpolating with str.format keeps
+# the static prefix byte-identical across requests, which server-side prompt
+# caching can exploit.
+_EXTRACT_KEYWORD_TMPL = """
+        Analyze the following video idea and extract the single most important noun or short noun phrase (2-3 words max) that represents the core subject. This keyword will be used to search Google Trends.
+
+        Your response MUST be only the keyword phrase itself, in lowercase, with no explanation, punctuation, or quotation marks.
+
+        - Idea: "A fun 8s TikTok about why iced coffee is better than hot coffee"
+        - Your Response: iced coffee
+
+        - Idea: "Make a tutorial on how to bake sourdough bread"
+        - Your Response: sourdough bread
+
+        - Idea: "A review of the new Tesla Cybertruck"
+        - Your Response: tesla cybertruck
+
+        - Idea: "{video_idea}"
+        - Your Response:
+        """
+
+_VIRAL_ANGLE_TMPL = """
+        You are a world-class social media strategist and viral trend analyst. Your task is to analyze a list of raw trend candidates and an original video idea, then formulate a single, concise 'Viral Angle' prompt for a scriptwriter AI.
+
+        **Original Idea:** "{original_idea}"
+
+        **Trend Candidates:**
+        {trend_list_str}
+
+        **Your Process:**
+        1.  **Analyze & Filter:** Review all trend candidates. You MUST DISCARD trends that are:
+            - Generic or redundant (e.g., 'Coffee', 'Cup' if the topic is coffee).
+            - Brand-unsafe, political, religious, or overly niche/strange.
+        2.  **Select for Virality:** From the safe and interesting trends, identify the 1-3 trends with the HIGHEST potential to make the video viral, engaging, and unique.
+        3.  **Formulate Viral Angle:** Combine the original idea with your chosen viral trends into a single, creative instruction sentence. This sentence is the final output.
+        4.  **Output Format:** Your final response MUST be a single JSON object containing two keys: "selected_trends" (a list of the exact trend names you chose) and "viral_angle" (the instruction sentence you formulated). Do not add any other text or markdown.
+
+        **EXAMPLE:**
+        - Original Idea: "Make a fun 8s TikTok about why iced coffee is better than hot coffee"
+        - Trend Candidates: ["Coffee", "Starbucks", "Dalgona coffee", "Autumn", "Cozy Coffee Shop"]
+        - Your Response:
+        {{
+            "selected_trends": ["Dalgona coffee", "Cozy Coffee Shop"],
+            "viral_angle": "Create a fun 8s TikTok showing iced coffee is superior to hot coffee by contrasting a boring hot coffee with a trendy, aesthetic 'Dalgona coffee' in a 'Cozy Coffee Shop' setting."
+        }}
+        """
+
+_SCRIPT_TMPL = """
+        You are an expert short-form video scriptwriter for platforms like TikTok and Instagram Reels.
+        Your task is to take a specific 'Viral Angle' and turn it into a complete, ready-to-shoot script concept.
+
+        **Viral Angle / Core Instruction:**
+        "{viral_angle}"
+
+        **Your Output:**
+        - Create a short, concise script (for an 8-15 second video).
+        - Include scene descriptions, dialogue/VO, and suggested on-screen text/hashtags.
+        - The tone should be authentic, punchy, and highly shareable.
+        """
+
+_ANGLE_AND_SCRIPT_TMPL = """
+        You are both a world-class social media strategist and an expert short-form video scriptwriter for platforms like TikTok and Instagram Reels. Your task is to analyze a list of raw trend candidates and an original video idea, formulate a single concise 'Viral Angle', then turn that angle into a complete, ready-to-shoot script concept.
+
+        **Original Idea:** "{original_idea}"
 
-app = FastAPI(title="Viral Script Generator API", version="1.0.0")
+        **Trend Candidates:**
+        {trend_list_str}
+
+        **Your Process:**
+        1.  **Analyze & Filter:** Review all trend candidates. You MUST DISCARD trends that are:
+            - Generic or redundant (e.g., 'Coffee', 'Cup' if the topic is coffee).
+            - Brand-unsafe, political, religious, or overly niche/strange.
+        2.  **Select for Virality:** From the safe and interesting trends, identify the 1-3 trends with the HIGHEST potential to make the video viral, engaging, and unique.
+        3.  **Formulate Viral Angle:** Combine the original idea with your chosen viral trends into a single, creative instruction sentence.
+        4.  **Write the Script:** Turn your viral angle into a short, concise script (for an 8-15 second video) with scene descriptions, dialogue/VO, and suggested on-screen text/hashtags. The tone should be authentic, punchy, and highly shareable.
+        5.  **Output Format:** Your final response MUST be a single JSON object with three keys: "selected_trends" (a list of the exact trend names you chose), "viral_angle" (the instruction sentence), and "script" (the full script concept).
+        """
+
+
+class _RedisTrendCache:
+    """Async adapter over Redis so multiple workers share one trend cache.
+
+    Entries are pickled and expire server-side via SETEX, so no pickle-file
+    persistence or in-process TTL bookkeeping is needed, and the awaited
+    client keeps trend lookups off the event loop's back.
+    """
+
+    def __init__(self, url: str, ttl: int):
+        import redis.asyncio
+        self._client = redis.asyncio.Redis.from_url(url)
+        self._ttl = ttl
+
+    @staticmethod
+    def _name(key: tuple) -> str:
+        return "vidcamp:trends:" + ":".join(key)
+
+    async def get(self, key: tuple):
+        raw = await self._client.get(self._name(key))
+        return pickle.loads(raw) if raw is not None else None
+
+    async def set(self, key: tuple, value):
+        await self._client.setex(self._name(key), self._ttl, pickle.dumps(value))
+
+    async def aclose(self):
+        await self._client.aclose()
+
+app = FastAPI(
+    title="Viral Script Generator API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+)
 
 class TrendInfusedScriptService:
     def __init__(self):
@@ -65,72 +228,163 @@ class TrendInfusedScriptService:
             raise ValueError("GEMINI_API_KEY environment variable is required")
             
         self.serpapi_api_key = serpapi_key
-        genai.configure(api_key=gemini_key)
+        # REST transport keeps one pooled keep-alive HTTP session per process,
+        # so requests don't re-pay TLS/channel setup on every generate_content
+        genai.configure(api_key=gemini_key, transport="rest")
         self.utility_model = genai.GenerativeModel(model_name=UTILITY_MODEL)
-        self.creative_model = genai.GenerativeModel(model_name=CREATIVE_MODEL)
-
-    def extract_keyword(self, video_idea: str) -> str:
-        """Extract base keyword from video idea"""
-        prompt = f"""
-        Analyze the following video idea and extract the single most important noun or short noun phrase (2-3 words max) that represents the core subject. This keyword will be used to search Google Trends.
+        self.creative_model = (
+            self.utility_model if CREATIVE_MODEL == UTILITY_MODEL
+            else genai.GenerativeModel(model_name=CREATIVE_MODEL)
+        )
+        self.semantic_cache = SemanticCache()
+        if REDIS_URL:
+            self._trend_cache = _RedisTrendCache(REDIS_URL, TREND_CACHE_TTL)
+        else:
+            self._trend_cache = TTLCache(maxsize=2048, ttl=TREND_CACHE_TTL)
+        self._trend_cache_lock = threading.Lock()
+        # In-flight dedup: concurrent identical requests await one task
+        self._inflight = {}
+        # Pooled keep-alive client for SerpAPI; HTTP/2 multiplexes the
+        # category and global trend requests onto a single connection
+        self._http = httpx.AsyncClient(
+            base_url="https://serpapi.com",
+            http2=True,
+            timeout=20.0,
+            limits=httpx.Limits(max_keepalive_connections=32),
+        )
 
-        Your response MUST be only the keyword phrase itself, in lowercase, with no explanation, punctuation, or quotation marks.
+    async def _singleflight(self, key: tuple, coro_factory):
+        """Coalesce concurrent duplicate work onto a single in-flight task.
 
-        - Idea: "A fun 8s TikTok about why iced coffee is better than hot coffee"
-        - Your Response: iced coffee
+        The first caller for a key runs the work; everyone else arriving
+        before it finishes awaits the same task, so a burst of identical
+        requests costs one upstream call instead of N.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(coro_factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _trend_cache_get(self, key: tuple):
+        if isinstance(self._trend_cache, _RedisTrendCache):
+            # Best-effort: an unreachable Redis is a cache miss, not an
+            # error — the upstream fetch still works without it
+            try:
+                return await self._trend_cache.get(key)
+            except Exception:
+                return None
+        with self._trend_cache_lock:
+            entry = self._trend_cache.get(key)
+        if entry is None:
+            return None
+        # Entries carry their creation time so reloads can't extend the TTL
+        value, created_at = entry
+        if time.time() - created_at >= TREND_CACHE_TTL:
+            return None
+        return value
+
+    async def _trend_cache_set(self, key: tuple, value):
+        if isinstance(self._trend_cache, _RedisTrendCache):
+            # Best-effort: never let a failed cache write turn a successful
+            # upstream response into an error
+            try:
+                await self._trend_cache.set(key, value)
+            except Exception:
+                pass
+            return
+        with self._trend_cache_lock:
+            self._trend_cache[key] = (value, time.time())
+
+    def load_trend_cache(self):
+        """Load the persisted trend cache so restarts don't cold-start"""
+        if not isinstance(self._trend_cache, TTLCache):
+            return  # Redis is already persistent and shared
+        try:
+            with open(TREND_CACHE_PATH, "rb") as f:
+                saved = pickle.load(f)
+            # Entries are (value, created_at) pairs; drop anything already
+            # past the TTL rather than letting update() restamp it as fresh
+            cutoff = time.time() - TREND_CACHE_TTL
+            fresh = {
+                key: entry for key, entry in saved.items()
+                if isinstance(entry, tuple) and len(entry) == 2 and entry[1] >= cutoff
+            }
+            with self._trend_cache_lock:
+                self._trend_cache.update(fresh)
+        except (OSError, pickle.PickleError, EOFError):
+            pass
+
+    def save_trend_cache(self):
+        """Persist the trend cache to disk on shutdown"""
+        if not isinstance(self._trend_cache, TTLCache):
+            return
+        try:
+            with self._trend_cache_lock:
+                saved = dict(self._trend_cache)
+            with open(TREND_CACHE_PATH, "wb") as f:
+                pickle.dump(saved, f)
+        except (OSError, pickle.PickleError):
+            pass
+
+    async def warmup(self):
+        """Pre-pay one-time client costs so the first real request doesn't.
+
+        The first generate_content of a process carries credential refresh
+        and TLS/connection setup; the SerpAPI account ping (free, no search
+        quota) populates that connection pool the same way.
+        """
+        try:
+            await run_in_threadpool(
+                self.utility_model.generate_content,
+                "ok",
+                generation_config={"max_output_tokens": 1},
+            )
+        except Exception:
+            pass
+        try:
+            await self._http.get("/account.json", params={"api_key": self.serpapi_api_key})
+        except Exception:
+            pass
 
-        - Idea: "Make a tutorial on how to bake sourdough bread"
-        - Your Response: sourdough bread
+    async def aclose(self):
+        await self._http.aclose()
+        if isinstance(self._trend_cache, _RedisTrendCache):
+            await self._trend_cache.aclose()
 
-        - Idea: "A review of the new Tesla Cybertruck"
-        - Your Response: tesla cybertruck
+    def extract_keyword(self, video_idea: str) -> str:
+        """Extract base keyword from video idea"""
+        prompt = _EXTRACT_KEYWORD_TMPL.format(video_idea=video_idea)
 
-        - Idea: "{video_idea}"
-        - Your Response:
-        """
-        
         try:
+            cached = self.semantic_cache.get("extract_keyword", video_idea)
+            if cached is not None:
+                return cached
+
             response = self.utility_model.generate_content(prompt)
             keyword = response.text.strip().lower()
             if not keyword or len(keyword) > 50:
                 raise ValueError("Invalid keyword returned")
+            self.semantic_cache.put("extract_keyword", video_idea, keyword)
             return keyword
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to extract keyword: {str(e)}")
 
-    def _parse_related_topics_csv(self, csv_data: list) -> dict:
-        """Parse CSV data from SerpAPI trends"""
-        if not csv_data:
-            return {"top": [], "rising": []}
-        
-        trends = {"top": [], "rising": []}
-        current_section = None
-        
-        for row in csv_data:
-            if not row:
-                continue
-            if row.upper() == "TOP":
-                current_section = "top"
-                continue
-            if row.upper() == "RISING":
-                current_section = "rising"
-                continue
-            if ":" in row or not current_section:
-                continue
-            
-            try:
-                topic = re.sub(r',(\+?\d+%?|Breakout)$', '', row).strip()
-                if topic:
-                    trends[current_section].append(topic)
-            except (IndexError, ValueError):
-                continue
-        
-        return trends
+    async def _fetch_category_trends(self, keyword: str, category_id: str) -> dict:
+        """Fetch category-specific related topics for a keyword"""
+        cache_key = ("category", keyword, category_id)
+        cached = await self._trend_cache_get(cache_key)
+        if cached is not None:
+            return cached
 
-    def fetch_trends(self, keyword: str, category_id: str) -> tuple:
-        """Fetch trends from Google Trends"""
+        return await self._singleflight(
+            cache_key, lambda: self._fetch_category_trends_uncached(keyword, category_id)
+        )
+
+    async def _fetch_category_trends_uncached(self, keyword: str, category_id: str) -> dict:
+        cache_key = ("category", keyword, category_id)
         try:
-            # Category-specific trends
             params_cat = {
                 "engine": "google_trends",
                 "q": keyword,
@@ -138,128 +392,287 @@ class TrendInfusedScriptService:
                 "data_type": "RELATED_TOPICS",
                 "date": "today 1-m",
                 "gprop": "youtube",
-                "csv": "true",
                 "api_key": self.serpapi_api_key
             }
-            
-            search_cat = GoogleSearch(params_cat)
-            results_cat = search_cat.get_dict()
-            
+
+            response = await self._http.get("/search.json", params=params_cat)
+            results_cat = orjson.loads(response.content)
+
             category_trends = {"top": [], "rising": []}
             if "error" not in results_cat:
-                category_trends = self._parse_related_topics_csv(results_cat.get("csv", []))
+                # The structured related_topics block replaces the old CSV
+                # output; no per-row regex parsing needed
+                related = results_cat.get("related_topics", {})
+                category_trends = {
+                    section: [
+                        t["topic"]["title"]
+                        for t in related.get(section, [])
+                        if isinstance(t, dict) and t.get("topic", {}).get("title")
+                    ]
+                    for section in ("top", "rising")
+                }
+
+            await self._trend_cache_set(cache_key, category_trends)
+
+            return category_trends
 
-            # Global trends
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch trends: {str(e)}")
+
+    async def _fetch_global_trends(self) -> list:
+        """Fetch globally trending searches (keyword-independent)"""
+        cache_key = ("global",)
+        cached = await self._trend_cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        return await self._singleflight(cache_key, self._fetch_global_trends_uncached)
+
+    async def _fetch_global_trends_uncached(self) -> list:
+        cache_key = ("global",)
+        try:
             params_global = {
                 "engine": "google_trends_trending_now",
                 "api_key": self.serpapi_api_key
             }
-            
-            search_global = GoogleSearch(params_global)
-            results_global = search_global.get_dict()
-            
+
+            response = await self._http.get("/search.json", params=params_global)
+            results_global = orjson.loads(response.content)
+
             global_trends = []
             if "error" not in results_global:
-                trending_searches = []
-                for key, value in results_global.items():
-                    if (isinstance(value, list) and len(value) > 0 and 
-                        isinstance(value[0], dict) and 'title' in value[0]):
-                        trending_searches = value
-                        break
-                
-                if trending_searches:
-                    global_trends = [
-                        t.get('title', {}).get('query') 
-                        for t in trending_searches 
-                        if t.get('title', {}).get('query')
-                    ]
-
-            return category_trends, global_trends
+                # The trending_now engine has a documented response key; no
+                # need to scan and type-check every key in the payload
+                trending_searches = (
+                    results_global.get("trending_searches")
+                    or results_global.get("daily_searches")
+                    or []
+                )
+                global_trends = [
+                    t["title"]["query"]
+                    for t in trending_searches
+                    if isinstance(t, dict) and t.get("title", {}).get("query")
+                ]
+
+            await self._trend_cache_set(cache_key, global_trends)
+
+            return global_trends
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to fetch trends: {str(e)}")
 
+    async def fetch_trends(self, keyword: str, category_id: str) -> tuple:
+        """Fetch trends from Google Trends"""
+        # The two requests are independent; overlap their network I/O
+        category_trends, global_trends = await asyncio.gather(
+            self._fetch_category_trends(keyword, category_id),
+            self._fetch_global_trends(),
+        )
+        return category_trends, global_trends
+
+    def _merge_trend_candidates(self, category_trends: dict, global_trends: list) -> list:
+        """Merge and dedupe trend sections, rising first, capped at 25"""
+        # One insertion-ordered dict keyed on the lowercased trend: a single
+        # setdefault per trend instead of a set lookup plus two appends
+        merged = {}
+        for trend in chain(category_trends.get("rising", []), category_trends.get("top", []), global_trends):
+            if trend:
+                merged.setdefault(trend.lower(), trend)
+
+        return list(merged.values())[:25]
+
+    def _prune_similar_trends(self, trend_candidates: list) -> list:
+        """Drop near-duplicate trends, keeping at most MAX_PROMPT_TRENDS.
+
+        Pairwise ratios are O(n^2) but n is at most 25 after merging.
+        """
+        kept = []
+        for trend in trend_candidates:
+            lowered = trend.lower()
+            if any(
+                SequenceMatcher(None, lowered, k.lower()).ratio() > TREND_SIMILARITY_THRESHOLD
+                for k in kept
+            ):
+                continue
+            kept.append(trend)
+            if len(kept) == MAX_PROMPT_TRENDS:
+                break
+        return kept
+
+    def _pack_trends_to_budget(self, trend_candidates: list, skeleton: str) -> list:
+        """Greedily keep trends until the prompt token budget is exhausted"""
+        budget = PROMPT_TOKEN_BUDGET - _approx_tokens(skeleton)
+        packed = []
+        for trend in trend_candidates:
+            if len(trend) > MAX_TREND_LENGTH:
+                continue
+            cost = _approx_tokens(f'- "{trend}"\n')
+            if cost > budget:
+                break
+            packed.append(trend)
+            budget -= cost
+        return packed
+
+    def _build_viral_angle_prompt(self, original_idea: str, trend_list_str: str) -> str:
+        return _VIRAL_ANGLE_TMPL.format(original_idea=original_idea, trend_list_str=trend_list_str)
+
     def generate_viral_angle(self, original_idea: str, category_trends: dict, global_trends: list) -> tuple:
         """Generate viral angle using AI"""
-        # Merge trends
-        merged, seen = [], set()
-        for section in [category_trends.get("rising", []), category_trends.get("top", []), global_trends]:
-            for trend in section:
-                if trend.lower() not in seen:
-                    merged.append(trend)
-                    seen.add(trend.lower())
-        
-        trend_candidates = merged[:25]
-        
+        trend_candidates = self._merge_trend_candidates(category_trends, global_trends)
+        trend_candidates = self._prune_similar_trends(trend_candidates)
+        trend_candidates = self._pack_trends_to_budget(
+            trend_candidates, self._build_viral_angle_prompt(original_idea, "")
+        )
+
         if not trend_candidates:
             return original_idea, []
 
         trend_list_str = "\n".join(f'- "{trend}"' for trend in trend_candidates)
-        prompt = f"""
-        You are a world-class social media strategist and viral trend analyst. Your task is to analyze a list of raw trend candidates and an original video idea, then formulate a single, concise 'Viral Angle' prompt for a scriptwriter AI.
+        prompt = self._build_viral_angle_prompt(original_idea, trend_list_str)
 
-        **Original Idea:** "{original_idea}"
+        cache_key = json.dumps({"idea": original_idea, "trends": sorted(trend_candidates)})
 
-        **Trend Candidates:**
-        {trend_list_str}
-
-        **Your Process:**
-        1.  **Analyze & Filter:** Review all trend candidates. You MUST DISCARD trends that are:
-            - Generic or redundant (e.g., 'Coffee', 'Cup' if the topic is coffee).
-            - Brand-unsafe, political, religious, or overly niche/strange.
-        2.  **Select for Virality:** From the safe and interesting trends, identify the 1-3 trends with the HIGHEST potential to make the video viral, engaging, and unique.
-        3.  **Formulate Viral Angle:** Combine the original idea with your chosen viral trends into a single, creative instruction sentence. This sentence is the final output.
-        4.  **Output Format:** Your final response MUST be a single JSON object containing two keys: "selected_trends" (a list of the exact trend names you chose) and "viral_angle" (the instruction sentence you formulated). Do not add any other text or markdown.
-
-        **EXAMPLE:**
-        - Original Idea: "Make a fun 8s TikTok about why iced coffee is better than hot coffee"
-        - Trend Candidates: ["Coffee", "Starbucks", "Dalgona coffee", "Autumn", "Cozy Coffee Shop"]
-        - Your Response:
-        {{
-            "selected_trends": ["Dalgona coffee", "Cozy Coffee Shop"],
-            "viral_angle": "Create a fun 8s TikTok showing iced coffee is superior to hot coffee by contrasting a boring hot coffee with a trendy, aesthetic 'Dalgona coffee' in a 'Cozy Coffee Shop' setting."
-        }}
-        """
-        
         try:
-            response = self.utility_model.generate_content(prompt)
-            cleaned_text = re.sub(r'```json\n?|```', '', response.text.strip())
-            result_json = json.loads(cleaned_text)
-            
-            viral_angle = result_json.get("viral_angle")
-            selected_trends = result_json.get("selected_trends", [])
-            
-            if not viral_angle or not isinstance(selected_trends, list):
-                raise ValueError("AI response missing required keys")
-                
+            cached = self.semantic_cache.get("generate_viral_angle", cache_key)
+            if cached is not None:
+                cached_json = orjson.loads(cached)
+                return cached_json["viral_angle"], cached_json["selected_trends"]
+
+            response = self.utility_model.generate_content(
+                prompt,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": _VIRAL_ANGLE_SCHEMA,
+                },
+            )
+            result_json = orjson.loads(response.text)
+
+            viral_angle = result_json["viral_angle"]
+            selected_trends = result_json["selected_trends"]
+
+            self.semantic_cache.put("generate_viral_angle", cache_key, json.dumps(
+                {"viral_angle": viral_angle, "selected_trends": selected_trends}
+            ))
             return viral_angle, selected_trends
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to generate viral angle: {str(e)}")
 
+    def _build_script_prompt(self, viral_angle: str) -> str:
+        return _SCRIPT_TMPL.format(viral_angle=viral_angle)
+
     def generate_script(self, viral_angle: str) -> str:
         """Generate script from viral angle"""
-        prompt = f"""
-        You are an expert short-form video scriptwriter for platforms like TikTok and Instagram Reels.
-        Your task is to take a specific 'Viral Angle' and turn it into a complete, ready-to-shoot script concept.
-
-        **Viral Angle / Core Instruction:**
-        "{viral_angle}"
+        prompt = self._build_script_prompt(viral_angle)
 
-        **Your Output:**
-        - Create a short, concise script (for an 8-15 second video).
-        - Include scene descriptions, dialogue/VO, and suggested on-screen text/hashtags.
-        - The tone should be authentic, punchy, and highly shareable.
-        """
-        
         try:
+            cached = self.semantic_cache.get("generate_script", viral_angle)
+            if cached is not None:
+                return cached
+
             response = self.creative_model.generate_content(prompt)
-            return response.text.strip()
+            script = response.text.strip()
+            self.semantic_cache.put("generate_script", viral_angle, script)
+            return script
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to generate script: {str(e)}")
 
+    def stream_script(self, viral_angle: str):
+        """Yield script chunks as Gemini produces them.
+
+        Streaming gets the first tokens to the client in a few hundred ms
+        instead of waiting for the full completion. Cache hits yield the
+        whole script at once; misses are accumulated and cached at the end.
+        Failures propagate to the caller, which reports them in-stream —
+        raising here would just sever an already-started 200 response.
+        """
+        cached = self.semantic_cache.get("generate_script", viral_angle)
+        if cached is not None:
+            yield cached
+            return
+
+        prompt = self._build_script_prompt(viral_angle)
+
+        response = self.creative_model.generate_content(prompt, stream=True)
+        parts = []
+        for chunk in response:
+            # Safety blocks / bare finish_reasons produce parts-less chunks
+            # whose .text accessor raises; skip them
+            if not chunk.parts:
+                continue
+            text = chunk.text
+            if text:
+                parts.append(text)
+                yield text
+        script = "".join(parts).strip()
+        if script:
+            self.semantic_cache.put("generate_script", viral_angle, script)
+
+    def _build_angle_and_script_prompt(self, original_idea: str, trend_list_str: str) -> str:
+        return _ANGLE_AND_SCRIPT_TMPL.format(original_idea=original_idea, trend_list_str=trend_list_str)
+
+    def generate_angle_and_script(self, original_idea: str, category_trends: dict, global_trends: list) -> tuple:
+        """Generate viral angle and script in a single Gemini call.
+
+        /full-pipeline used to pay two sequential LLM round-trips for the
+        angle and the script; fusing them into one structured-output prompt
+        halves the round-trip and prefill overhead.
+        """
+        trend_candidates = self._merge_trend_candidates(category_trends, global_trends)
+        trend_candidates = self._prune_similar_trends(trend_candidates)
+        trend_candidates = self._pack_trends_to_budget(
+            trend_candidates, self._build_angle_and_script_prompt(original_idea, "")
+        )
+
+        if not trend_candidates:
+            return original_idea, [], self.generate_script(original_idea)
+
+        trend_list_str = "\n".join(f'- "{trend}"' for trend in trend_candidates)
+        prompt = self._build_angle_and_script_prompt(original_idea, trend_list_str)
+        cache_key = json.dumps({"idea": original_idea, "trends": sorted(trend_candidates)})
+
+        try:
+            cached = self.semantic_cache.get("generate_angle_and_script", cache_key)
+            if cached is not None:
+                cached_json = orjson.loads(cached)
+                return cached_json["viral_angle"], cached_json["selected_trends"], cached_json["script"]
+
+            response = self.creative_model.generate_content(
+                prompt,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": _ANGLE_AND_SCRIPT_SCHEMA,
+                },
+            )
+            result_json = orjson.loads(response.text)
+
+            viral_angle = result_json["viral_angle"]
+            selected_trends = result_json["selected_trends"]
+            script = result_json["script"]
+
+            self.semantic_cache.put("generate_angle_and_script", cache_key, json.dumps(
+                {"viral_angle": viral_angle, "selected_trends": selected_trends, "script": script}
+            ))
+            return viral_angle, selected_trends, script
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to generate angle and script: {str(e)}")
+
 # Initialize service
 service = TrendInfusedScriptService()
 
+@app.on_event("startup")
+async def load_caches():
+    service.load_trend_cache()
+    # Blocking SDK calls run via run_in_threadpool, which draws from anyio's
+    # limiter; its default 40 tokens cap concurrency well below what the
+    # external APIs can handle
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 200
+    await service.warmup()
+
+@app.on_event("shutdown")
+async def save_caches():
+    service.save_trend_cache()
+    await service.aclose()
+
 # --- ENDPOINTS ---
 
 @app.get("/")
@@ -269,22 +682,19 @@ async def root():
 @app.post("/extract-keyword", response_model=KeywordResponse)
 async def extract_keyword(request: VideoIdeaRequest):
     """Extract keyword from video idea"""
-    keyword = service.extract_keyword(request.video_idea)
-    return KeywordResponse(keyword=keyword, original_idea=request.video_idea)
+    keyword = await service._singleflight(
+        ("extract_keyword", request.video_idea),
+        lambda: run_in_threadpool(service.extract_keyword, request.video_idea),
+    )
+    return KeywordResponse.model_construct(keyword=keyword, original_idea=request.video_idea)
 
 @app.post("/fetch-trends", response_model=TrendsResponse)
-async def fetch_trends(request: dict):
+async def fetch_trends(request: FetchTrendsRequest):
     """Fetch trends based on keyword and category"""
-    keyword = request.get("keyword")
-    category_id = request.get("category_id", "71")
-    
-    if not keyword:
-        raise HTTPException(status_code=400, detail="Keyword is required")
-    
-    category_trends, global_trends = service.fetch_trends(keyword, category_id)
-    
-    return TrendsResponse(
-        keyword=keyword,
+    category_trends, global_trends = await service.fetch_trends(request.keyword, request.category_id)
+
+    return TrendsResponse.model_construct(
+        keyword=request.keyword,
         category_trends=category_trends,
         global_trends=global_trends
     )
@@ -292,53 +702,94 @@ async def fetch_trends(request: dict):
 @app.post("/generate-viral-angle", response_model=ViralAngleResponse)
 async def generate_viral_angle(request: ViralAngleRequest):
     """Generate viral angle from trends and original idea"""
-    viral_angle, selected_trends = service.generate_viral_angle(
+    viral_angle, selected_trends = await run_in_threadpool(
+        service.generate_viral_angle,
         request.original_idea,
         request.category_trends,
         request.global_trends
     )
     
-    return ViralAngleResponse(
+    return ViralAngleResponse.model_construct(
         viral_angle=viral_angle,
         selected_trends=selected_trends
     )
 
-@app.post("/generate-script", response_model=ScriptResponse)
+@app.post("/generate-script")
 async def generate_script(request: ScriptRequest):
-    """Generate script from viral angle"""
-    script = service.generate_script(request.viral_angle)
-    return ScriptResponse(script=script)
+    """Generate script from viral angle, streamed as server-sent events"""
+    async def event_stream():
+        try:
+            async for chunk in iterate_in_threadpool(service.stream_script(request.viral_angle)):
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        except Exception as e:
+            # The 200 is already on the wire; report failures in-band so the
+            # client gets more than a dropped connection
+            yield f"data: {json.dumps({'error': f'Failed to generate script: {e}'})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/generate-script-sync", response_model=ScriptResponse)
+async def generate_script_sync(request: ScriptRequest):
+    """Generate script from viral angle (non-streaming, for backward compat)"""
+    script = await run_in_threadpool(service.generate_script, request.viral_angle)
+    return ScriptResponse.model_construct(script=script)
+
+async def _run_full_pipeline(video_idea: str, category_id: str) -> FullPipelineResponse:
+    # Responses below are built with model_construct: the service layer
+    # guarantees the types, so re-validating server-produced values is wasted
+    # work. Inbound request models keep full validation.
+    # Global trends don't depend on the keyword; start fetching them
+    # while the keyword is being extracted
+    global_task = asyncio.create_task(service._fetch_global_trends())
+
+    try:
+        # Step 1: Extract keyword
+        keyword = await run_in_threadpool(service.extract_keyword, video_idea)
+
+        # Step 2: Fetch category trends
+        category_trends = await service._fetch_category_trends(keyword, category_id)
+    except BaseException:
+        # Don't abandon the global fetch on the error path: cancel it and
+        # retrieve its outcome so a failure there isn't logged as a
+        # never-retrieved task exception
+        global_task.cancel()
+        try:
+            await global_task
+        except BaseException:
+            pass
+        raise
+
+    # Collect the global fetch
+    global_trends = await global_task
+
+    # Step 3: Generate viral angle + script in one fused LLM call
+    viral_angle, selected_trends, script = await run_in_threadpool(
+        service.generate_angle_and_script, video_idea, category_trends, global_trends
+    )
+
+    return FullPipelineResponse.model_construct(
+        original_idea=video_idea,
+        keyword=keyword,
+        viral_angle=viral_angle,
+        selected_trends=selected_trends,
+        script=script,
+        trends_data={
+            "category_trends": category_trends,
+            "global_trends": global_trends
+        }
+    )
 
 @app.post("/full-pipeline", response_model=FullPipelineResponse)
 async def full_pipeline(request: VideoIdeaRequest):
     """Run the complete pipeline in one call"""
     try:
-        # Step 1: Extract keyword
-        keyword = service.extract_keyword(request.video_idea)
-        
-        # Step 2: Fetch trends
-        category_trends, global_trends = service.fetch_trends(keyword, request.category_id)
-        
-        # Step 3: Generate viral angle
-        viral_angle, selected_trends = service.generate_viral_angle(
-            request.video_idea, category_trends, global_trends
+        # Coalesce duplicate bursts: identical in-flight pipelines share one run
+        return await service._singleflight(
+            ("full_pipeline", request.video_idea, request.category_id),
+            lambda: _run_full_pipeline(request.video_idea, request.category_id),
         )
-        
-        # Step 4: Generate script
-        script = service.generate_script(viral_angle)
-        
-        return FullPipelineResponse(
-            original_idea=request.video_idea,
-            keyword=keyword,
-            viral_angle=viral_angle,
-            selected_trends=selected_trends,
-            script=script,
-            trends_data={
-                "category_trends": category_trends,
-                "global_trends": global_trends
-            }
-        )
-        
+
     except HTTPException:
         raise
     except Exception as e:
@@ -346,4 +797,13 @@ async def full_pipeline(request: VideoIdeaRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # One worker per core; set REDIS_URL so the workers share a trend cache
+    # (the sqlite semantic cache is a shared file already)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=os.cpu_count(),
+        loop="uvloop",
+        http="httptools",
+    )
\ No newline at end of file
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import google.generativeai as genai
+from cachetools import TTLCache
+
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+class SemanticCache:
+    """Semantic cache for LLM responses backed by sqlite.
+
+    Entries are stored per-namespace together with an embedding of their
+    semantic input. Lookups first try an exact match on a BLAKE2b hash of the
+    input (no embedding cost), then fall back to a cosine-similarity search
+    over the namespace; anything above `similarity_threshold` counts as a hit.
+    Entries expire after `ttl` seconds since trends (and trend-derived
+    responses) go stale.
+    """
+
+    def __init__(self, db_path: str = None, similarity_threshold: float = 0.92, ttl: int = 86400):
+        self.db_path = db_path or os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache.db")
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Exact-match fast path: (namespace, key_hash) -> (response,
+        # created_at). Bounded by the TTLCache, but staleness is enforced
+        # against the stored creation time on read — the container's own
+        # insertion-time clock restarts when a sqlite hit is re-inserted,
+        # which would otherwise double the effective TTL
+        self._exact = TTLCache(maxsize=4096, ttl=ttl)
+        # Embeddings computed during a miss, reused by the following put().
+        # Bounded and short-lived: entries are popped on the put() or on a
+        # semantic hit, and the TTL sweeps up strays left by failed
+        # generations so the dict can't grow without bound
+        self._pending_embeddings = TTLCache(maxsize=256, ttl=300)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # WAL lets the N workers sharing this file read while one writes,
+        # and the busy timeout rides out short write contention
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key_hash TEXT NOT NULL,
+                embedding TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key_hash)
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _cosine(a: list, b: list) -> float:
+        dot = sum(x * y for x, y in zip(a, b))
+        norm_a = math.sqrt(sum(x * x for x in a))
+        norm_b = math.sqrt(sum(x * x for x in b))
+        if not norm_a or not norm_b:
+            return 0.0
+        return dot / (norm_a * norm_b)
+
+    def _embed(self, text: str) -> list:
+        result = genai.embed_content(model=EMBEDDING_MODEL, content=text)
+        return result["embedding"]
+
+    def get(self, namespace: str, text: str):
+        """Return the cached response for `text`, or None on a miss."""
+        key_hash = self._hash(text)
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            exact = self._exact.get((namespace, key_hash))
+        if exact is not None:
+            response, created_at = exact
+            if created_at >= cutoff:
+                return response
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM entries WHERE namespace = ? AND key_hash = ?",
+                (namespace, key_hash),
+            ).fetchone()
+        if row and row[1] >= cutoff:
+            # Carry the row's original creation time so the fast path can't
+            # outlive the sqlite entry's staleness bound
+            with self._lock:
+                self._exact[(namespace, key_hash)] = (row[0], row[1])
+            return row[0]
+
+        try:
+            embedding = self._embed(text)
+        except Exception:
+            return None
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT embedding, response FROM entries WHERE namespace = ? AND created_at >= ?",
+                (namespace, cutoff),
+            ).fetchall()
+
+        best_score, best_response = 0.0, None
+        for stored_embedding, response in rows:
+            score = self._cosine(embedding, json.loads(stored_embedding))
+            if score > best_score:
+                best_score, best_response = score, response
+
+        if best_response is not None and best_score >= self.similarity_threshold:
+            return best_response
+
+        # Confirmed miss: keep the embedding for the put() that follows a
+        # successful generation. Hits never record one, so nothing strands.
+        with self._lock:
+            self._pending_embeddings[(namespace, key_hash)] = embedding
+        return None
+
+    def put(self, namespace: str, text: str, response: str):
+        """Store a response, reusing the embedding computed by the preceding get()."""
+        key_hash = self._hash(text)
+        with self._lock:
+            embedding = self._pending_embeddings.pop((namespace, key_hash), None)
+        if embedding is None:
+            try:
+                embedding = self._embed(text)
+            except Exception:
+                return
+        created_at = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (namespace, key_hash, embedding, response, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (namespace, key_hash, json.dumps(embedding), response, created_at),
+                )
+                self._conn.commit()
+            except sqlite3.Error:
+                # Best-effort: a locked or contended cache file must not turn
+                # a successful generation into an error for the caller
+                pass
+            self._exact[(namespace, key_hash)] = (response, created_at)